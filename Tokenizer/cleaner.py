@@ -0,0 +1,163 @@
+"""
+Comment cleaning shared by data prep, model training, and the web app so
+    every stage tokenizes identically normalized text. Run as a script to
+    benchmark the cleaning against the original per-row approach.
+"""
+
+import re
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+
+# Text left behind by the regulations.gov comment box
+COMMENT_ARTIFACTS = ['PLEASE WRITE YOUR COMMENT HERE:']
+
+CHUNK_SIZE = 100000
+
+_artifact_pattern = '|'.join(re.escape(a) for a in COMMENT_ARTIFACTS)
+
+
+def clean_comments(comments, chunk_size=CHUNK_SIZE):
+    """
+    Normalizes comment text with vectorized string operations, processed in
+        chunks to bound the size of intermediate copies: unicode NFKC
+        normalization, comment box artifact removal, and whitespace
+        collapsing/stripping
+    :param comments: pd.Series or sequence of string(s)
+    :param chunk_size: int of how many comments to clean at a time
+    :return: pd.Series of cleaned comments with object dtype (index and name
+        are preserved when `comments` is a Series)
+    """
+    if not isinstance(comments, pd.Series):
+        comments = pd.Series(list(comments), dtype=object)
+
+    chunks = [_clean_chunk(comments.iloc[i:i + chunk_size])
+              for i in range(0, len(comments), chunk_size)]
+
+    if not chunks:
+        return comments.astype(object)
+
+    return pd.concat(chunks)
+
+
+def comment_hashes(cleaned):
+    """
+    Computes a stable content hash per comment, used for de-duplication and
+        kept as the `Comment_Hash` column of the pickled datasets so caches and
+        indexes can key on it (the same text always maps to the same value
+        across runs)
+    :param cleaned: pd.Series of cleaned comments
+    :return: pd.Series of uint64 hashes aligned with `cleaned`
+    """
+    hashes = pd.util.hash_pandas_object(cleaned, index=False)
+    hashes.name = 'Comment_Hash'
+
+    return hashes
+
+
+def drop_duplicate_comments(df, col='Comment'):
+    """
+    Drops rows whose (already cleaned) comment text duplicates an earlier row
+    :param df: DataFrame with a column of cleaned comments
+    :param col: name of the comment column
+    :return: DataFrame keeping the first occurrence of each comment
+    """
+    return df[~comment_hashes(df[col]).duplicated().values]
+
+
+def _clean_chunk(chunk):
+    """
+    :param chunk: pd.Series of raw comments
+    :return: pd.Series of cleaned comments
+    """
+    # Form letters repeat heavily, so only clean each distinct text once
+    codes, uniques = pd.factorize(chunk.fillna('').astype(str))
+
+    uniques = pd.Series(uniques, dtype=object)
+    uniques = uniques.str.normalize('NFKC')
+    uniques = uniques.str.replace(_artifact_pattern, ' ', regex=True)
+    uniques = uniques.str.replace(r'\s+', ' ', regex=True)
+    uniques = uniques.str.strip()
+
+    return pd.Series(uniques.values.take(codes),
+                     index=chunk.index,
+                     name=chunk.name,
+                     dtype=object)
+
+
+def make_synthetic_comments(n_comments, random_state=42):
+    """
+    Builds synthetic comments from a small phrase bank for benchmarking: some
+        carry comment box artifacts, about half are signed (and so unique),
+        and the rest repeat like form letters
+    :param n_comments: int of how many comments to generate
+    :param random_state: int seed for reproducibility
+    :return: pd.Series of synthetic comments
+    """
+    rng = np.random.RandomState(random_state)
+    phrases = np.array(['Protect our wetlands and waterways.',
+                        'Clean water is important to farms everywhere.',
+                        'I support the   proposed rule.',
+                        'Please keep the 2015 Clean Water Rule in place!',
+                        'We need clear rules for WOTUS.\n',
+                        '\tThe revision removes important protections.'])
+    prefixes = np.array(['', '', '', COMMENT_ARTIFACTS[0] + '  '])
+
+    comments = pd.Series(prefixes[rng.randint(len(prefixes), size=n_comments)],
+                         dtype=object)
+    for _ in range(3):
+        comments += phrases[rng.randint(len(phrases), size=n_comments)]
+        comments += ' '
+
+    signed = rng.rand(n_comments) < 0.5
+    comments[signed] += ('Regards, commenter '
+                         + pd.Series(np.arange(n_comments)[signed]).astype(str)
+                         .values)
+
+    return comments
+
+
+def benchmark(n_comments=1000000):
+    """
+    Times the original per-row artifact removal and exact-string de-duplication
+        against `clean_comments` and hash-based de-duplication
+    :param n_comments: int of how many synthetic comments to clean
+    """
+    comments = make_synthetic_comments(n_comments)
+    print('Synthetic comments: {0:,.0f}'.format(n_comments))
+    print('-' * 50)
+
+    start = time.perf_counter()
+    per_row = comments.apply(
+        lambda s: s.replace('PLEASE WRITE YOUR COMMENT HERE:', ''))
+    per_row = per_row.drop_duplicates()
+    print('Per-row apply + drop_duplicates: {0:.2f}s'
+          .format(time.perf_counter() - start))
+
+    # Same normalization as `clean_comments`, one row at a time
+    start = time.perf_counter()
+    comments.apply(lambda s: re.sub(
+        r'\s+', ' ', re.sub(_artifact_pattern, ' ',
+                            unicodedata.normalize('NFKC', s))).strip())
+    print('Per-row apply, full normalization: {0:.2f}s'
+          .format(time.perf_counter() - start))
+
+    start = time.perf_counter()
+    cleaned = clean_comments(comments)
+    print('clean_comments: {0:.2f}s'.format(time.perf_counter() - start))
+
+    start = time.perf_counter()
+    hashes = comment_hashes(cleaned)
+    unique = cleaned[~hashes.duplicated().values]
+    print('comment_hashes + de-duplication: {0:.2f}s'
+          .format(time.perf_counter() - start))
+    print('-' * 50)
+    print('Unique comments (per-row): {0:,.0f}'.format(len(per_row)))
+    print('Unique comments (cleaned): {0:,.0f}'.format(len(unique)))
+
+
+if __name__ == '__main__':
+    benchmark()
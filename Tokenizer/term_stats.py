@@ -0,0 +1,169 @@
+"""
+Term statistics computed straight from a sparse count matrix (e.g. the output
+    of a fitted CountVectorizer) for word clouds and top-word reports. Memory
+    scales with the vocabulary size and number of groups, not the corpus text.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+
+
+class TermStats:
+    """
+    Accumulates per-group term frequencies and document frequencies, where a
+        group is any per-comment key such as a sentiment label or topic number
+
+    >>> stats = TermStats(count_vec)
+    >>> stats.update(count_data, y_train.values)
+    >>> WordCloud().generate_from_frequencies(stats.frequencies(1))
+    """
+
+    def __init__(self, count_vect):
+        """
+        :param count_vect: a fitted CountVectorizer() instance
+        """
+        self.count_vect = count_vect
+
+        vocab = count_vect.vocabulary_
+        self.terms = np.empty(len(vocab), dtype=object)
+        self.terms[list(vocab.values())] = list(vocab.keys())
+
+        self.term_freqs = {}
+        self.doc_freqs = {}
+        self.n_docs = {}
+
+    @property
+    def groups(self):
+        return sorted(self.term_freqs)
+
+    def update(self, count_data, groups):
+        """
+        Adds the counts of already vectorized comments to the running totals
+        :param count_data: sparse (n_comments x vocabulary) count matrix
+        :param groups: sequence with one group key per row of `count_data`
+        :return: self
+        """
+        count_data = sp.csr_matrix(count_data)
+        keys, group_idx = np.unique(np.asarray(groups), return_inverse=True)
+
+        # One-hot (n_groups x n_comments) mask sums every group's rows at once
+        masks = sp.csr_matrix((np.ones(len(group_idx), dtype=np.int64),
+                               (group_idx, np.arange(len(group_idx)))),
+                              shape=(len(keys), count_data.shape[0]))
+
+        # Indicator matrix shares the index arrays instead of copying them
+        present = sp.csr_matrix((np.ones_like(count_data.data),
+                                 count_data.indices,
+                                 count_data.indptr),
+                                shape=count_data.shape)
+
+        # Fixed dtype so batches of counts and float weights can be mixed
+        tfs = (masks @ count_data).toarray().astype(np.float64)
+        dfs = (masks @ present).toarray().astype(np.float64)
+        counts = np.bincount(group_idx, minlength=len(keys))
+
+        for key, tf, df, n in zip(keys.tolist(), tfs, dfs, counts):
+            if key in self.term_freqs:
+                self.term_freqs[key] += tf
+                self.doc_freqs[key] += df
+                self.n_docs[key] += n
+            else:
+                self.term_freqs[key] = tf
+                self.doc_freqs[key] = df
+                self.n_docs[key] = n
+
+        return self
+
+    def add_comments(self, comments, groups):
+        """
+        Vectorizes new comments and adds them to the running totals
+        :param comments: sequence of string(s)
+        :param groups: sequence with one group key per comment
+        :return: self
+        """
+        return self.update(self.count_vect.transform(comments), groups)
+
+    def term_frequencies(self, group=None):
+        """
+        :param group: a group key, or None for all groups combined
+        :return: Numpy array of term counts indexed like `self.terms` (a copy,
+            so later updates don't change it)
+        """
+        if group is None:
+            if not self.groups:
+                return np.zeros(len(self.terms))
+            return np.sum([self.term_freqs[g] for g in self.groups], axis=0)
+
+        return self.term_freqs[group].copy()
+
+    def document_frequencies(self, group=None):
+        """
+        :param group: a group key, or None for all groups combined
+        :return: Numpy array of how many comments contain each term (a copy,
+            so later updates don't change it)
+        """
+        if group is None:
+            if not self.groups:
+                return np.zeros(len(self.terms))
+            return np.sum([self.doc_freqs[g] for g in self.groups], axis=0)
+
+        return self.doc_freqs[group].copy()
+
+    def frequencies(self, group=None):
+        """
+        :param group: a group key, or None for all groups combined
+        :return: dict of term -> count for terms that occur, the input format
+            for WordCloud.generate_from_frequencies()
+        """
+        tf = self.term_frequencies(group)
+        nonzero = np.flatnonzero(tf)
+
+        return dict(zip(self.terms[nonzero], tf[nonzero].tolist()))
+
+    def top_terms(self, group=None, n=10):
+        """
+        :param group: a group key, or None for all groups combined
+        :param n: int for how many top terms to return
+        :return: list of the n most frequent terms, leaving out terms that
+            never occur
+        """
+        tf = self.term_frequencies(group)
+        top_idx = self._top_index(tf, n)
+
+        return self.terms[top_idx[tf[top_idx] > 0]].tolist()
+
+    def distinguishing_terms(self, group, n=10, alpha=0.01):
+        """
+        Ranks terms by how strongly they distinguish `group` from all other
+            groups, using the z-score of the smoothed log-odds ratio
+        :param group: a group key
+        :param n: int for how many terms to return
+        :param alpha: float smoothing count added to every term
+        :return: list of the n most distinguishing terms
+        """
+        scores = self.distinguishing_scores(group, alpha)
+
+        return self.terms[self._top_index(scores, n)].tolist()
+
+    def distinguishing_scores(self, group, alpha=0.01):
+        """
+        :param group: a group key
+        :param alpha: float smoothing count added to every term
+        :return: Numpy array of log-odds z-scores indexed like `self.terms`
+        """
+        y_in = self.term_freqs[group] + alpha
+        y_out = self.term_frequencies() - self.term_freqs[group] + alpha
+
+        log_odds_in = np.log(y_in) - np.log(y_in.sum() - y_in)
+        log_odds_out = np.log(y_out) - np.log(y_out.sum() - y_out)
+
+        return (log_odds_in - log_odds_out) / np.sqrt(1 / y_in + 1 / y_out)
+
+    def _top_index(self, scores, n):
+        """
+        :param scores: Numpy array indexed like `self.terms`
+        :param n: int for how many terms to return
+        :return: Numpy array of the positions of the n highest scores, with
+            ties going to the earlier vocabulary index
+        """
+        return np.argsort(-scores, kind='stable')[:n]
@@ -4,25 +4,47 @@ Script to re-create the final models prototyped in the WOTUS_analysis.ipynb
 """
 
 import pickle
+import time
+import tracemalloc
+import warnings
+import numpy as np
 import pandas as pd
+from sklearn import metrics
 from sklearn.preprocessing import normalize
 from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
 from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import FunctionTransformer
 from sklearn.decomposition import NMF
 from sklearn.linear_model import LogisticRegression
+from sklearn.utils import resample
 
+from Tokenizer.cleaner import clean_comments, drop_duplicate_comments
 from Tokenizer.tokenizer import external_spacy_tokenizer as tokenizer
 
 
 TRAIN_SENT_CLF = True
 TRAIN_NMF = True
+COMPARE_BALANCING = False
 SAVE_MODELS = False
 
+# How the sentiment classifier balances the classes:
+#    'weights' - unique labeled comments with balanced class weights
+#    'resampled' - unique labeled comments vectorized once, then rows
+#        upsampled by index before fitting the classifier
+#    'upsampled' - the pickled, physically upsampled training set
+# Keep 'upsampled' until COMPARE_BALANCING shows the others match it on
+#    the real data
+BALANCE_MODE = 'upsampled'
+
+# Largest allowed drop in held-out accuracy, F1, or AUROC vs. 'upsampled'
+PARITY_TOLERANCE = 0.02
+
 
 def main():
     # Data paths
     upsamp_path = './Data/upsamp_train.pkl'
     X_train_path = './Data/X_train.pkl'
+    y_train_path = './Data/y_train.pkl'
     all_lab_path = './Data/comments_labeled.pkl'
 
     test_comment = """This revision removes bodies of water that are important
@@ -35,19 +57,13 @@ def main():
         print('Training Sentiment Classifier')
 
         # Train sentiment classifier
-        X_up, y_up = get_upsamp_labeled_comments(upsamp_path)
+        if BALANCE_MODE == 'upsampled':
+            X_clf, y_clf = get_upsamp_labeled_comments(upsamp_path)
+        else:
+            X_clf, y_clf = get_labeled_train_comments(X_train_path,
+                                                      y_train_path)
 
-        tf_vec = TfidfVectorizer(tokenizer=tokenizer,
-                                 stop_words=None,
-                                 max_df=0.90,
-                                 min_df=5)
-
-        clf_pipe = make_pipeline(tf_vec,
-                                 LogisticRegression(C=5,
-                                                    n_jobs=-1,
-                                                    random_state=42))
-
-        clf_pipe.fit(X_up['Comment'], y_up)
+        clf_pipe = fit_sent_clf(X_clf['Comment'], y_clf, BALANCE_MODE)
 
         print(test_comment)
         print('Model prediction:')
@@ -75,7 +91,10 @@ def main():
         nmf = NMF(n_components=8,
                   random_state=42)
 
-        nmf_pipe = make_pipeline(count_vec, nmf)
+        nmf_pipe = make_pipeline(FunctionTransformer(clean_comments,
+                                                     validate=False),
+                                 count_vec,
+                                 nmf)
 
         nmf_pipe.fit(X_train['Comment'])
 
@@ -94,6 +113,174 @@ def main():
         print(df_n_largest)
         print(df_n_largest['Cosine Similarity'])
 
+    if COMPARE_BALANCING:
+        print('-' * 50)
+        print('Comparing Class Balancing Approaches')
+
+        X_up, y_up = get_upsamp_labeled_comments(upsamp_path)
+        X_lab, y_lab = get_labeled_train_comments(X_train_path, y_train_path)
+        X_test, y_test = get_labeled_test_comments(all_lab_path, X_train_path)
+
+        train_sets = {'upsampled': (X_up['Comment'], y_up),
+                      'weights': (X_lab['Comment'], y_lab),
+                      'resampled': (X_lab['Comment'], y_lab)}
+
+        results = compare_balancing(train_sets, X_test['Comment'], y_test)
+        print(results)
+        check_parity(results, PARITY_TOLERANCE)
+
+
+def make_sent_clf_pipe(class_weight=None):
+    """
+    :param class_weight: passed to LogisticRegression, None or 'balanced'
+    :return: unfitted scikit-learn pipeline that cleans, TF-IDF vectorizes,
+        and classifies raw comment text
+    """
+    tf_vec = TfidfVectorizer(tokenizer=tokenizer,
+                             stop_words=None,
+                             max_df=0.90,
+                             min_df=5)
+
+    # Cleaning is the first pipeline step so the web app normalizes
+    #    its input exactly as the training comments were
+    return make_pipeline(FunctionTransformer(clean_comments,
+                                             validate=False),
+                         tf_vec,
+                         LogisticRegression(C=5,
+                                            class_weight=class_weight,
+                                            n_jobs=-1,
+                                            random_state=42))
+
+
+def fit_sent_clf(X, y, balance_mode=BALANCE_MODE):
+    """
+    Fits the sentiment classifier pipeline, balancing the classes according to
+        `balance_mode` (see BALANCE_MODE)
+    :param X: pd.Series of comment text
+    :param y: pd.Series of comment labels
+    :param balance_mode: str, one of 'weights', 'resampled', or 'upsampled'
+    :return: fitted scikit-learn pipeline that can handle raw text
+    """
+    if balance_mode not in ('weights', 'resampled', 'upsampled'):
+        raise ValueError('Unknown balance_mode: {}'.format(balance_mode))
+
+    class_weight = 'balanced' if balance_mode == 'weights' else None
+    clf_pipe = make_sent_clf_pipe(class_weight)
+
+    if balance_mode == 'resampled':
+        # Vectorize each unique comment once, then upsample rows by index
+        cleaner, tf_vec, clf = [step for _, step in clf_pipe.steps]
+        feats = tf_vec.fit_transform(cleaner.fit_transform(X))
+        idx = get_balanced_index(y)
+        clf.fit(feats[idx], np.asarray(y)[idx])
+    else:
+        clf_pipe.fit(X, y)
+
+    return clf_pipe
+
+
+def get_balanced_index(y, random_state=42):
+    """
+    Upsamples (with replacement) the row positions of every minority class to
+        the size of the majority class, as the notebook did with the
+        comments themselves
+    :param y: sequence of labels
+    :param random_state: int seed for reproducibility
+    :return: Numpy array of row positions into `y`
+    """
+    y = np.asarray(y)
+    classes, counts = np.unique(y, return_counts=True)
+
+    idx = []
+    for cls, count in zip(classes, counts):
+        cls_idx = np.flatnonzero(y == cls)
+        if count < counts.max():
+            cls_idx = resample(cls_idx,
+                               replace=True,
+                               n_samples=counts.max(),
+                               random_state=random_state)
+        idx.append(cls_idx)
+
+    return np.concatenate(idx)
+
+
+def compare_balancing(train_sets, X_test, y_test):
+    """
+    Fits the sentiment classifier once per balancing approach and scores each
+        on the same held-out comments
+    :param train_sets: dict of balance_mode -> (comment text, labels) to train
+        that approach on
+    :param X_test: pd.Series of held-out comment text
+    :param y_test: pd.Series of held-out labels
+    :return: DataFrame with vectorized and classifier row counts, fit time,
+        peak traced memory, and accuracy, F1, and AUROC on the held-out
+        comments (plus their difference from 'upsampled') for each approach
+    """
+    results = []
+
+    for balance_mode, (X, y) in train_sets.items():
+        # Time an untraced fit, since tracemalloc slows allocation-heavy
+        #    tokenization; a second, traced fit measures peak memory
+        start = time.perf_counter()
+        clf_pipe = fit_sent_clf(X, y, balance_mode)
+        fit_time = time.perf_counter() - start
+
+        tracemalloc.start()
+        fit_sent_clf(X, y, balance_mode)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if balance_mode == 'resampled':
+            clf_rows = len(get_balanced_index(y))
+        else:
+            clf_rows = len(X)
+
+        preds = clf_pipe.predict(X_test)
+        probs = clf_pipe.predict_proba(X_test)[:, 1]
+
+        results.append([balance_mode,
+                        len(X),
+                        clf_rows,
+                        fit_time,
+                        peak / 1e6,
+                        metrics.accuracy_score(y_test, preds),
+                        metrics.f1_score(y_test, preds),
+                        metrics.roc_auc_score(y_test, probs)])
+
+    results = pd.DataFrame(results,
+                           columns=['Balance Mode', 'Vectorized Rows',
+                                    'Classifier Rows', 'Fit Time (s)',
+                                    'Peak Memory (MB)', 'Accuracy', 'F1',
+                                    'AUROC']).set_index('Balance Mode')
+
+    if 'upsampled' in results.index:
+        for col in ['Accuracy', 'F1', 'AUROC']:
+            results[col + ' Delta'] = (results[col]
+                                       - results.loc['upsampled', col])
+
+    return results
+
+
+def check_parity(results, tolerance=PARITY_TOLERANCE):
+    """
+    Warns for every balancing approach whose held-out accuracy, F1, or AUROC
+        falls more than `tolerance` below the 'upsampled' baseline
+    :param results: DataFrame returned by compare_balancing()
+    :param tolerance: float, largest allowed drop in any metric
+    :return: True if every approach is within tolerance, else False
+    """
+    delta_cols = [c for c in results.columns if c.endswith(' Delta')]
+    drifts = results[delta_cols] < -tolerance
+
+    for balance_mode, col in zip(*np.nonzero(drifts.values)):
+        warnings.warn('{0} {1} is {2:.4f} vs. upsampled (tolerance {3})'
+                      .format(results.index[balance_mode],
+                              delta_cols[col],
+                              results.iloc[balance_mode][delta_cols[col]],
+                              tolerance))
+
+    return not drifts.values.any()
+
 
 def get_nmf_feats(X_all_labeled, nmf_pipe):
     """
@@ -168,20 +355,58 @@ def get_X_train_comments(path):
 
 def get_all_labeled_comments(path):
     """
-    Loads two DataFrames for the entire set of labeled comments
+    Loads two DataFrames for the entire set of labeled comments, cleaned and
+        de-duplicated so the comment text can serve as a unique index
     :param path: a path to the pickled dataset
     :return: two DataFrames, X_all_labeled has original index and the comments,
         y_all_labeled has the comment text as the index and the labels
     """
     lab_comments = pd.read_pickle(path)
+    lab_comments['Comment'] = clean_comments(lab_comments['Comment'])
+    lab_comments = drop_duplicate_comments(lab_comments)
 
     X_all_labeled = lab_comments.drop('Support_Rule_Change', axis=1)
-    y_all_labeled = lab_comments.set_index('Comment')
+    y_all_labeled = lab_comments.set_index('Comment')[['Support_Rule_Change']]
     y_all_labeled.columns = ['Label']
 
     return X_all_labeled, y_all_labeled
 
 
+def get_labeled_train_comments(X_path, y_path):
+    """
+    Loads two DataFrames for the labeled comments in the training set, each
+        unique comment appearing once
+    :param X_path: a path to the pickled training set comments
+    :param y_path: a path to the pickled training set labels (-1=unlabeled)
+    :return: X_lab_train includes comment text, y_lab_train includes labels
+    """
+    X_train = pd.read_pickle(X_path)
+    y_train = pd.read_pickle(y_path)
+
+    X_lab_train = X_train[y_train != -1]
+    y_lab_train = y_train[y_train != -1]
+
+    return X_lab_train, y_lab_train
+
+
+def get_labeled_test_comments(all_lab_path, X_train_path):
+    """
+    Loads the labeled comments held out of the training set
+    :param all_lab_path: a path to the pickled set of all labeled comments
+    :param X_train_path: a path to the pickled training set comments
+    :return: X_lab_test includes comment text, y_lab_test includes labels
+    """
+    lab_comments = pd.read_pickle(all_lab_path)
+    X_train = pd.read_pickle(X_train_path)
+
+    lab_test = lab_comments[~lab_comments.index.isin(X_train.index)]
+
+    X_lab_test = lab_test.drop('Support_Rule_Change', axis=1)
+    y_lab_test = lab_test['Support_Rule_Change']
+
+    return X_lab_test, y_lab_test
+
+
 def get_upsamp_labeled_comments(path):
     """
     Loads two DataFrames for the up-sampled labeled training set
@@ -7,6 +7,8 @@ import pandas as pd
 from sklearn.preprocessing import normalize
 import streamlit as st
 
+from Tokenizer.cleaner import clean_comments, drop_duplicate_comments
+
 
 def main():
     st.title('Sentiment Classifier and Similarity Analysis Demo')
@@ -109,8 +111,10 @@ def main():
 @st.cache(allow_output_mutation=True)  # Changes caused by .predict() ok
 def get_clf_model():
     """
-    Loads pre-trained pickled model
-    :return: scikit-learn pipeline including vectorizer and model
+    Loads pre-trained pickled model saved by the WOTUS_analysis.ipynb
+        notebook (`winner`), whose first step cleans raw comments with
+        `clean_comments` exactly as the training comments were cleaned
+    :return: scikit-learn pipeline including cleaning, vectorizer, and model
     """
     with open('final_sentiment_clf.pkl', 'rb') as f:
         model = pickle.load(f)
@@ -133,15 +137,18 @@ def get_nmf_model():
 @st.cache()
 def get_all_labeled_comments():
     """
-    Loads two DataFrames for the entire set of labeled comments
+    Loads two DataFrames for the entire set of labeled comments, cleaned the
+        same way as the model training data
     :param path: a path to the pickled dataset
     :return: two DataFrames, X_all_labeled has original index and the comments,
         y_all_labeled has the comment text as the index and the labels
     """
     lab_comments = pd.read_pickle('./Data/comments_word_labels.pkl')
+    lab_comments['Comment'] = clean_comments(lab_comments['Comment'])
+    lab_comments = drop_duplicate_comments(lab_comments)
 
     X_all_labeled = lab_comments.drop('Support_Rule_Change', axis=1)
-    y_all_labeled = lab_comments.set_index('Comment')
+    y_all_labeled = lab_comments.set_index('Comment')[['Support_Rule_Change']]
     y_all_labeled.columns = ['Label']
 
     return X_all_labeled, y_all_labeled